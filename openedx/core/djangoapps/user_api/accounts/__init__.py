@@ -71,8 +71,7 @@ PASSWORD_BAD_MIN_LENGTH_MSG = _(u"Password is not long enough.")
 PASSWORD_BAD_MAX_LENGTH_MSG = _(u"Password cannot be longer than {max} character.").format(max=PASSWORD_MAX_LENGTH)
 
 # These strings are normally not user-facing.
-USERNAME_BAD_TYPE_MSG = u"Username must be a string."
-EMAIL_BAD_TYPE_MSG = u"Email must be a string."
+UNICODE_INVALID_MSG = u"Input not valid unicode"
 PASSWORD_BAD_TYPE_MSG = u"Password must be a string."
 
 # Translators: This message is shown to users who enter a password matching
@@ -9,13 +9,14 @@ from pytz import UTC
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 from django.core.validators import validate_email, ValidationError
+from django.db.models import Case, IntegerField, Max, Prefetch, Q, Value, When
+from django.db.models.query import prefetch_related_objects
 from django.http import HttpResponseForbidden
 from openedx.core.djangoapps.user_api.preferences.api import update_user_preferences
 from openedx.core.djangoapps.user_api.errors import PreferenceValidationError, AccountValidationError
 
-from student.models import User, UserProfile, Registration
+from student.models import LanguageProficiency, User, UserProfile, Registration
 from student import forms as student_forms
-from student import views as student_views
 from util.model_utils import emit_setting_changed_event
 
 from openedx.core.lib.api.view_utils import add_serializer_errors
@@ -31,6 +32,11 @@ from openedx.core.djangoapps.user_api import errors, accounts, forms, helpers
 # Public access point for this function.
 visible_fields = _visible_fields
 
+# Fields that cannot be edited through update_account_settings.
+_READ_ONLY_FIELDS = frozenset(
+    AccountUserSerializer.get_read_only_fields() + AccountLegacyProfileSerializer.get_read_only_fields()
+)
+
 
 @helpers.intercept_errors(errors.UserAPIInternalError, ignore_errors=[errors.UserAPIRequestError])
 def get_account_settings(request, usernames=None, configuration=None, view=None):
@@ -65,25 +71,40 @@ def get_account_settings(request, usernames=None, configuration=None, view=None)
     requesting_user = request.user
     usernames = usernames or [requesting_user.username]
 
-    requested_users = User.objects.select_related('profile').filter(username__in=usernames)
+    requested_users = list(User.objects.select_related('profile').filter(username__in=usernames))
     if not requested_users:
         raise errors.UserNotFound()
 
-    serialized_users = []
-    for user in requested_users:
-        has_full_access = requesting_user.is_staff or requesting_user.username == user.username
-        if has_full_access and view != 'shared':
-            admin_fields = settings.ACCOUNT_VISIBILITY_CONFIGURATION.get('admin_fields')
-        else:
-            admin_fields = None
-        serialized_users.append(UserReadOnlySerializer(
+    # The serializer reads each profile's language proficiencies and social links, so fetch
+    # them for all of the users at once to avoid issuing extra queries per user. Only the code
+    # of a language proficiency is serialized, along with the column needed to match it to its profile.
+    prefetch_related_objects(requested_users, [
+        Prefetch(
+            'profile__language_proficiencies',
+            queryset=LanguageProficiency.objects.only('code', 'user_profile')
+        ),
+        'profile__social_links',
+    ])
+
+    # Only staff and the users themselves see the admin fields, and then only outside the "shared" view.
+    if view == 'shared':
+        admin_fields = None
+        has_staff_access = False
+    else:
+        admin_fields = settings.ACCOUNT_VISIBILITY_CONFIGURATION.get('admin_fields')
+        has_staff_access = requesting_user.is_staff
+    requesting_username = requesting_user.username
+    context = {'request': request}
+
+    return [
+        UserReadOnlySerializer(
             user,
             configuration=configuration,
-            custom_fields=admin_fields,
-            context={'request': request}
-        ).data)
-
-    return serialized_users
+            custom_fields=admin_fields if has_staff_access or requesting_username == user.username else None,
+            context=context
+        ).data
+        for user in requested_users
+    ]
 
 
 @helpers.intercept_errors(errors.UserAPIInternalError, ignore_errors=[errors.UserAPIRequestError])
@@ -115,10 +136,15 @@ def update_account_settings(requesting_user, update, username=None):
         errors.UserAPIInternalError: the operation failed due to an unexpected error.
 
     """
+    # The student views pull in a large part of the LMS, so only import them when an account is updated.
+    from student import views as student_views
+
     if username is None:
         username = requesting_user.username
 
-    existing_user, existing_user_profile = _get_user_and_profile(username)
+    # The old language proficiencies are recorded below for eventing, so load them along with the profile.
+    prefetch = ('profile__language_proficiencies',) if "language_proficiencies" in update else ()
+    existing_user, existing_user_profile = _get_user_and_profile(username, prefetch=prefetch)
 
     if requesting_user.username != username:
         raise errors.UserNotAuthorized()
@@ -138,9 +164,7 @@ def update_account_settings(requesting_user, update, username=None):
         old_name = existing_user_profile.name
 
     # Check for fields that are not editable. Marking them read-only causes them to be ignored, but we wish to 400.
-    read_only_fields = set(update.keys()).intersection(
-        AccountUserSerializer.get_read_only_fields() + AccountLegacyProfileSerializer.get_read_only_fields()
-    )
+    read_only_fields = _READ_ONLY_FIELDS.intersection(update)
 
     # Build up all field errors, whether read-only, validation, or email errors.
     field_errors = {}
@@ -179,7 +203,9 @@ def update_account_settings(requesting_user, update, username=None):
         # We have not found a way using signals to get the language proficiency changes (grouped by user).
         # As a workaround, store old and new values here and emit them after save is complete.
         if "language_proficiencies" in update:
-            old_language_proficiencies = list(existing_user_profile.language_proficiencies.values('code'))
+            old_language_proficiencies = [
+                {'code': language.code} for language in existing_user_profile.language_proficiencies.all()
+            ]
 
         for serializer in user_serializer, legacy_profile_serializer:
             serializer.save()
@@ -205,15 +231,13 @@ def update_account_settings(requesting_user, update, username=None):
         # serializer so that we can store who requested the change.
         if old_name:
             meta = existing_user_profile.get_meta()
-            if 'old_names' not in meta:
-                meta['old_names'] = []
-            meta['old_names'].append([
+            meta.setdefault('old_names', []).append([
                 old_name,
                 u"Name change requested through account API by {0}".format(requesting_user.username),
-                datetime.datetime.now(UTC).isoformat()
+                datetime.datetime.utcnow().replace(tzinfo=UTC).isoformat()
             ])
             existing_user_profile.set_meta(meta)
-            existing_user_profile.save()
+            existing_user_profile.save(update_fields=['meta'])
 
     except PreferenceValidationError as err:
         raise AccountValidationError(err.preference_errors)
@@ -238,7 +262,6 @@ def update_account_settings(requesting_user, update, username=None):
 
 
 @helpers.intercept_errors(errors.UserAPIInternalError, ignore_errors=[errors.UserAPIRequestError])
-@transaction.atomic
 def create_account(username, password, email):
     """Create a new user account.
 
@@ -295,18 +318,20 @@ def create_account(username, password, email):
     user = User(username=username, email=email, is_active=False)
     user.set_password(password)
 
-    try:
-        user.save()
-    except IntegrityError:
-        raise errors.AccountUserAlreadyExists
+    # Only the writes happen inside the transaction; validation and password hashing are done above.
+    with transaction.atomic():
+        try:
+            user.save()
+        except IntegrityError:
+            raise errors.AccountUserAlreadyExists
 
-    # Create a registration to track the activation process
-    # This implicitly saves the registration.
-    registration = Registration()
-    registration.register(user)
+        # Create a registration to track the activation process
+        # This implicitly saves the registration.
+        registration = Registration()
+        registration.register(user)
 
-    # Create an empty user profile with default values
-    UserProfile(user=user).save()
+        # Create an empty user profile with default values
+        UserProfile(user=user).save()
 
     # Return the activation key, which the caller should send to the user
     return registration.activation_key
@@ -329,18 +354,22 @@ def check_account_exists(username=None, email=None):
         ["email", "username"]
 
     """
-    conflicts = []
-
-    try:
-        _validate_email_doesnt_exist(email)
-    except errors.AccountEmailAlreadyExists:
-        conflicts.append("email")
-    try:
-        _validate_username_doesnt_exist(username)
-    except errors.AccountUsernameAlreadyExists:
-        conflicts.append("username")
+    lookups = [(field, value) for field, value in (("email", email), ("username", username)) if value is not None]
+    if not lookups:
+        return []
+
+    # Let the database decide which fields conflict, so that the comparison follows its collation,
+    # and have it return a single row of flags however many accounts match.
+    query = Q()
+    flags = {}
+    for field, value in lookups:
+        query |= Q(**{field: value})
+        flags[field + '_exists'] = Max(
+            Case(When(Q(**{field: value}), then=Value(1)), default=Value(0), output_field=IntegerField())
+        )
+    matches = User.objects.filter(query).aggregate(**flags)
 
-    return conflicts
+    return [field for field, _value in lookups if matches[field + '_exists']]
 
 
 @helpers.intercept_errors(errors.UserAPIInternalError, ignore_errors=[errors.UserAPIRequestError])
@@ -387,6 +416,12 @@ def request_password_change(email, is_secure):
         errors.UserAPIInternalError: the operation failed due to an unexpected error.
 
     """
+    # No account can have a malformed email address, so reject those before building the form.
+    try:
+        _validate_email(email)
+    except errors.AccountEmailInvalid:
+        raise errors.UserNotFound
+
     # Binding data to a form requires that the data be passed as a dictionary
     # to the Form class constructor.
     form = forms.PasswordResetFormNoActive({'email': email})
@@ -500,16 +535,57 @@ def get_email_existence_validation_error(email):
     return _validate(_validate_email_doesnt_exist, errors.AccountEmailAlreadyExists, email)
 
 
-def _get_user_and_profile(username):
+def validate_registration_fields(username, email, password):
+    """Get the built-in validation error messages for the username,
+    email and password of a new account in a single pass.
+
+    The format of each field is checked first. The username and email
+    are then checked for existence conflicts with one combined query,
+    skipping either one if its format is already invalid.
+
+    :param username: The proposed username (unicode).
+    :param email: The proposed email (unicode).
+    :param password: The proposed password (unicode).
+    :return: Dict mapping "username", "email" and "password" to their
+        validation error messages, or empty strings if there is no error.
+
+    """
+    decisions = {
+        "username": get_username_validation_error(username),
+        "email": get_email_validation_error(email),
+        "password": get_password_validation_error(password, username),
+    }
+
+    # We prefer seeing for invalidity first, so only check for conflicts on well-formed values.
+    # Some invalid usernames or emails (like for superusers) may exist.
+    conflicts = check_account_exists(
+        username=None if decisions["username"] else username,
+        email=None if decisions["email"] else email,
+    )
+    if "username" in conflicts:
+        decisions["username"] = _username_conflict_message(username)
+    if "email" in conflicts:
+        decisions["email"] = _email_conflict_message(email)
+
+    return decisions
+
+
+def _get_user_and_profile(username, prefetch=()):
     """
     Helper method to return the legacy user and profile objects based on username.
+
+    Any lookups in `prefetch` are passed through to `prefetch_related` on the user query.
     """
     try:
-        existing_user = User.objects.get(username=username)
+        existing_user = User.objects.select_related('profile').prefetch_related(*prefetch).get(username=username)
     except ObjectDoesNotExist:
         raise errors.UserNotFound()
 
-    existing_user_profile, _ = UserProfile.objects.get_or_create(user=existing_user)
+    # Nearly every user already has a profile, which the join above has loaded.
+    try:
+        existing_user_profile = existing_user.profile
+    except UserProfile.DoesNotExist:
+        existing_user_profile = UserProfile.objects.create(user=existing_user)
 
     return existing_user, existing_user_profile
 
@@ -545,20 +621,16 @@ def _validate_username(username):
         errors.AccountUsernameInvalid
 
     """
+    if not isinstance(username, unicode) and not _is_valid_byte_string(username):
+        raise errors.AccountUsernameInvalid(accounts.UNICODE_INVALID_MSG)
+    if not accounts.USERNAME_MIN_LENGTH <= len(username) <= accounts.USERNAME_MAX_LENGTH:
+        raise errors.AccountUsernameInvalid(accounts.USERNAME_BAD_LENGTH_MSG)
     try:
-        _validate_unicode(username)
-        _validate_type(username, basestring, accounts.USERNAME_BAD_TYPE_MSG)
-        _validate_length(
-            username,
-            accounts.USERNAME_MIN_LENGTH,
-            accounts.USERNAME_MAX_LENGTH,
-            accounts.USERNAME_BAD_LENGTH_MSG
-        )
         with override_language('en'):
             # `validate_username` provides a proper localized message, however the API needs only the English
             # message by convention.
             student_forms.validate_username(username)
-    except (UnicodeError, errors.AccountDataBadType, errors.AccountDataBadLength, ValidationError) as username_err:
+    except ValidationError as username_err:
         raise errors.AccountUsernameInvalid(username_err.message)
 
 
@@ -575,14 +647,14 @@ def _validate_email(email):
         errors.AccountEmailInvalid
 
     """
+    if not isinstance(email, unicode) and not _is_valid_byte_string(email):
+        raise errors.AccountEmailInvalid(accounts.UNICODE_INVALID_MSG)
+    if not accounts.EMAIL_MIN_LENGTH <= len(email) <= accounts.EMAIL_MAX_LENGTH:
+        raise errors.AccountEmailInvalid(accounts.EMAIL_BAD_LENGTH_MSG)
     try:
-        _validate_unicode(email)
-        _validate_type(email, basestring, accounts.EMAIL_BAD_TYPE_MSG)
-        _validate_length(email, accounts.EMAIL_MIN_LENGTH, accounts.EMAIL_MAX_LENGTH, accounts.EMAIL_BAD_LENGTH_MSG)
-        validate_email.message = accounts.EMAIL_INVALID_MSG.format(email=email)
         validate_email(email)
-    except (UnicodeError, errors.AccountDataBadType, errors.AccountDataBadLength, ValidationError) as invalid_email_err:
-        raise errors.AccountEmailInvalid(invalid_email_err.message)
+    except ValidationError:
+        raise errors.AccountEmailInvalid(accounts.EMAIL_INVALID_MSG.format(email=email))
 
 
 def _validate_confirm_email(confirm_email, email):
@@ -614,19 +686,18 @@ def _validate_password(password, username=None):
         errors.AccountPasswordInvalid
 
     """
-    try:
-        _validate_type(password, basestring, accounts.PASSWORD_BAD_TYPE_MSG)
+    if not isinstance(password, basestring):
+        raise errors.AccountPasswordInvalid(accounts.PASSWORD_BAD_TYPE_MSG)
 
-        if len(password) == 0:
-            raise errors.AccountPasswordInvalid(accounts.PASSWORD_EMPTY_MSG)
-        elif len(password) < accounts.PASSWORD_MIN_LENGTH:
-            raise errors.AccountPasswordInvalid(accounts.PASSWORD_BAD_MIN_LENGTH_MSG)
-        elif len(password) > accounts.PASSWORD_MAX_LENGTH:
-            raise errors.AccountPasswordInvalid(accounts.PASSWORD_BAD_MAX_LENGTH_MSG)
+    password_length = len(password)
+    if password_length == 0:
+        raise errors.AccountPasswordInvalid(accounts.PASSWORD_EMPTY_MSG)
+    elif password_length < accounts.PASSWORD_MIN_LENGTH:
+        raise errors.AccountPasswordInvalid(accounts.PASSWORD_BAD_MIN_LENGTH_MSG)
+    elif password_length > accounts.PASSWORD_MAX_LENGTH:
+        raise errors.AccountPasswordInvalid(accounts.PASSWORD_BAD_MAX_LENGTH_MSG)
 
-        _validate_password_works_with_username(password, username)
-    except (errors.AccountDataBadType, errors.AccountDataBadLength) as invalid_password_err:
-        raise errors.AccountPasswordInvalid(invalid_password_err.message)
+    _validate_password_works_with_username(password, username)
 
 
 def _validate_country(country):
@@ -648,7 +719,7 @@ def _validate_username_doesnt_exist(username):
     :raises: errors.AccountUsernameAlreadyExists
     """
     if username is not None and User.objects.filter(username=username).exists():
-        raise errors.AccountUsernameAlreadyExists(_(accounts.USERNAME_CONFLICT_MSG).format(username=username))
+        raise errors.AccountUsernameAlreadyExists(_username_conflict_message(username))
 
 
 def _validate_email_doesnt_exist(email):
@@ -659,7 +730,25 @@ def _validate_email_doesnt_exist(email):
     :raises: errors.AccountEmailAlreadyExists
     """
     if email is not None and User.objects.filter(email=email).exists():
-        raise errors.AccountEmailAlreadyExists(_(accounts.EMAIL_CONFLICT_MSG).format(email_address=email))
+        raise errors.AccountEmailAlreadyExists(_email_conflict_message(email))
+
+
+def _username_conflict_message(username):
+    """Get the validation error message for a username that belongs to an existing account.
+
+    :param username: The proposed username (unicode).
+    :return: Validation error message.
+    """
+    return _(accounts.USERNAME_CONFLICT_MSG).format(username=username)
+
+
+def _email_conflict_message(email):
+    """Get the validation error message for an email that belongs to an existing account.
+
+    :param email: The proposed email (unicode).
+    :return: Validation error message.
+    """
+    return _(accounts.EMAIL_CONFLICT_MSG).format(email_address=email)
 
 
 def _validate_password_works_with_username(password, username=None):
@@ -677,50 +766,19 @@ def _validate_password_works_with_username(password, username=None):
         raise errors.AccountPasswordInvalid(accounts.PASSWORD_CANT_EQUAL_USERNAME_MSG)
 
 
-def _validate_type(data, type, err):
-    """Checks whether the input data is of type. If not,
-    throws a generic error message.
+def _is_valid_byte_string(data):
+    """Checks whether the input data is a byte string that can be
+    decoded to unicode.
 
     :param data: The data to check.
-    :param type: The type to check against.
-    :param err: The error message to throw back if data is not of type.
-    :return: None
-    :raises: errors.AccountDataBadType
-
-    """
-    if not isinstance(data, type):
-        raise errors.AccountDataBadType(err)
-
-
-def _validate_length(data, min, max, err):
-    """Validate that the data's length is less than or equal to max,
-    and greater than or equal to min.
-
-    :param data: The data to do the test on.
-    :param min: The minimum allowed length.
-    :param max: The maximum allowed length.
-    :param err: The error message to throw back if data's length is below min or above max.
-    :return: None
-    :raises: errors.AccountDataBadLength
-
-    """
-    if len(data) < min or len(data) > max:
-        raise errors.AccountDataBadLength(err)
-
-
-def _validate_unicode(data, err=u"Input not valid unicode"):
-    """Checks whether the input data is valid unicode or not.
-
-    :param data: The data to check for unicode validity.
-    :param err: The error message to throw back if unicode is invalid.
-    :return: None
-    :raises: UnicodeError
+    :return: True if data is a decodable byte string, False otherwise.
 
     """
+    if not isinstance(data, str):
+        return False
     try:
-        if not isinstance(data, str) and not isinstance(data, unicode):
-            raise UnicodeError(err)
-        # In some cases we pass the above, but it's still inappropriate utf-8.
+        # In some cases we get a byte string, but it's still inappropriate utf-8.
         unicode(data)
     except UnicodeError:
-        raise UnicodeError(err)
+        return False
+    return True
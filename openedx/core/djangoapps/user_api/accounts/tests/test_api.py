@@ -17,8 +17,13 @@ from student.tests.factories import UserFactory
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.test.client import RequestFactory
 from openedx.core.djangoapps.user_api.accounts import (
+    EMAIL_CONFLICT_MSG,
+    EMAIL_INVALID_MSG,
+    USERNAME_CONFLICT_MSG,
     USERNAME_MAX_LENGTH,
     PRIVATE_VISIBILITY
 )
@@ -27,7 +32,9 @@ from openedx.core.djangoapps.user_api.accounts.api import (
     update_account_settings,
     create_account,
     activate_account,
-    request_password_change
+    check_account_exists,
+    request_password_change,
+    validate_registration_fields
 )
 from openedx.core.djangoapps.user_api.errors import (
     UserNotFound, UserNotAuthorized,
@@ -39,7 +46,7 @@ from openedx.core.djangoapps.user_api.accounts.tests.testutils import (
     INVALID_EMAILS, INVALID_PASSWORDS, INVALID_USERNAMES, VALID_USERNAMES_UNICODE
 )
 from openedx.core.djangolib.testing.utils import skip_unless_lms
-from student.models import PendingEmailChange
+from student.models import LanguageProficiency, PendingEmailChange, SocialLink
 from student.tests.tests import UserSettingsEventTestMixin
 
 
@@ -80,6 +87,38 @@ class TestAccountApi(UserSettingsEventTestMixin, TestCase):
         account_settings = get_account_settings(self.default_request, usernames=[self.different_user.username])[0]
         self.assertEqual(self.different_user.username, account_settings["username"])
 
+    @patch("openedx.core.djangoapps.user_api.accounts.serializers.UserPreference.get_value", Mock(return_value=None))
+    def test_get_multiple_users_query_count(self):
+        """
+        Test that the number of queries made by get_account_settings does not grow with the number of
+        users, even when each of them has language proficiencies and social links. The account privacy
+        preference, which is looked up separately for each user, is mocked out.
+        """
+        users = [UserFactory.create() for __ in range(3)]
+        for user in users:
+            LanguageProficiency.objects.create(user_profile=user.profile, code='en')
+            SocialLink.objects.create(
+                user_profile=user.profile,
+                platform='facebook',
+                social_link='https://www.facebook.com/{}'.format(user.username)
+            )
+        usernames = [user.username for user in users]
+        request = self.request_factory.get("/api/user/v1/accounts/")
+        request.user = self.staff_user
+
+        # Warm up anything that is only looked up on the first call.
+        get_account_settings(request, usernames)
+
+        with CaptureQueriesContext(connection) as two_user_queries:
+            get_account_settings(request, usernames[:2])
+        with self.assertNumQueries(len(two_user_queries.captured_queries)):
+            account_settings = get_account_settings(request, usernames)
+
+        self.assertEqual(len(account_settings), 3)
+        for account in account_settings:
+            self.assertEqual([{'code': 'en'}], account['language_proficiencies'])
+            self.assertEqual(1, len(account['social_links']))
+
     def test_get_configuration_provided(self):
         """Test the difference in behavior when a configuration is supplied to get_account_settings."""
         config = {
@@ -379,6 +418,42 @@ class AccountCreationActivationAndPasswordChangeTest(TestCase):
     def test_create_account_invalid_username(self, invalid_username):
         create_account(invalid_username, self.PASSWORD, self.EMAIL)
 
+    @ddt.data(
+        ({}, []),
+        ({'username': USERNAME}, ['username']),
+        ({'email': EMAIL}, ['email']),
+        ({'username': USERNAME, 'email': EMAIL}, ['email', 'username']),
+        ({'username': USERNAME, 'email': 'different+email@example.com'}, ['username']),
+        ({'username': 'different_user', 'email': EMAIL}, ['email']),
+        ({'username': 'different_user', 'email': 'different+email@example.com'}, []),
+        # The row matched through the email must not count as a username conflict.
+        ({'username': 'Francis-Underwood', 'email': EMAIL}, ['email']),
+    )
+    @ddt.unpack
+    def test_check_account_exists(self, kwargs, expected_conflicts):
+        create_account(self.USERNAME, self.PASSWORD, self.EMAIL)
+        with self.assertNumQueries(1 if kwargs else 0):
+            self.assertEqual(check_account_exists(**kwargs), expected_conflicts)
+
+    def test_validate_registration_fields(self):
+        create_account(self.USERNAME, self.PASSWORD, self.EMAIL)
+        # Existence of the username and email is checked with a single query.
+        with self.assertNumQueries(1):
+            decisions = validate_registration_fields(self.USERNAME, self.EMAIL, self.PASSWORD)
+        self.assertEqual(decisions, {
+            'username': USERNAME_CONFLICT_MSG.format(username=self.USERNAME),
+            'email': EMAIL_CONFLICT_MSG.format(email_address=self.EMAIL),
+            'password': '',
+        })
+
+    def test_validate_registration_fields_invalid_format(self):
+        # Existence is not checked for values that are already invalid.
+        with self.assertNumQueries(0):
+            decisions = validate_registration_fields(u'', u'invalid', self.PASSWORD)
+        self.assertNotEqual(decisions['username'], '')
+        self.assertEqual(decisions['email'], EMAIL_INVALID_MSG.format(email=u'invalid'))
+        self.assertEqual(decisions['password'], '')
+
     @raises(UserNotAuthorized)
     def test_activate_account_invalid_key(self):
         activate_account(u'invalid')
@@ -409,6 +484,17 @@ class AccountCreationActivationAndPasswordChangeTest(TestCase):
         # Verify that no email messages have been sent
         self.assertEqual(len(mail.outbox), 0)
 
+    @skip_unless_lms
+    @ddt.data(*INVALID_EMAILS)
+    def test_request_password_change_invalid_email(self, invalid_email):
+        # Malformed email addresses are rejected without looking up any users.
+        with self.assertNumQueries(0):
+            with self.assertRaises(UserNotFound):
+                request_password_change(invalid_email, self.IS_SECURE)
+
+        # Verify that no email messages have been sent
+        self.assertEqual(len(mail.outbox), 0)
+
     @skip_unless_lms
     def test_request_password_change_inactive_user(self):
         # Create an account, but do not activate it
@@ -63,16 +63,6 @@ class AccountCountryInvalid(AccountRequestError):
     pass
 
 
-class AccountDataBadLength(AccountRequestError):
-    """The requested account data is either too short or too long. """
-    pass
-
-
-class AccountDataBadType(AccountRequestError):
-    """The requested account data is of the wrong type. """
-    pass
-
-
 class AccountUpdateError(AccountRequestError):
     """
     An update to the account failed. More detailed information is present in developer_message,
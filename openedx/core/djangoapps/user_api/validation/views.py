@@ -7,14 +7,10 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from openedx.core.djangoapps.user_api.accounts.api import (
-    get_email_validation_error,
-    get_email_existence_validation_error,
     get_confirm_email_validation_error,
     get_country_validation_error,
     get_name_validation_error,
-    get_password_validation_error,
-    get_username_validation_error,
-    get_username_existence_validation_error
+    validate_registration_fields
 )
 
 
@@ -111,45 +107,24 @@ class RegistrationValidationView(APIView):
         name = request.data.get('name')
         return get_name_validation_error(name)
 
-    def username_handler(self, request):
-        username = request.data.get('username')
-        invalid_username_error = get_username_validation_error(username)
-        username_exists_error = get_username_existence_validation_error(username)
-        # We prefer seeing for invalidity first.
-        # Some invalid usernames (like for superusers) may exist.
-        return invalid_username_error or username_exists_error
-
-    def email_handler(self, request):
-        email = request.data.get('email')
-        invalid_email_error = get_email_validation_error(email)
-        email_exists_error = get_email_existence_validation_error(email)
-        # We prefer seeing for invalidity first.
-        # Some invalid emails (like a blank one for superusers) may exist.
-        return invalid_email_error or email_exists_error
-
     def confirm_email_handler(self, request):
         email = request.data.get('email', None)
         confirm_email = request.data.get('confirm_email')
         return get_confirm_email_validation_error(confirm_email, email)
 
-    def password_handler(self, request):
-        username = request.data.get('username', None)
-        password = request.data.get('password')
-        return get_password_validation_error(password, username)
-
     def country_handler(self, request):
         country = request.data.get('country')
         return get_country_validation_error(country)
 
     validation_handlers = {
         "name": name_handler,
-        "username": username_handler,
-        "email": email_handler,
         "confirm_email": confirm_email_handler,
-        "password": password_handler,
         "country": country_handler
     }
 
+    # These fields are validated together, so that their existence checks share a single query.
+    registration_fields = ("username", "email", "password")
+
     def post(self, request):
         """
         POST /api/user/v1/validation/registration/
@@ -169,6 +144,17 @@ class RegistrationValidationView(APIView):
         like when the password may not equal the username.
         """
         validation_decisions = {}
+
+        requested_registration_fields = [key for key in self.registration_fields if key in request.data]
+        if requested_registration_fields:
+            registration_decisions = validate_registration_fields(
+                request.data.get('username'),
+                request.data.get('email'),
+                request.data.get('password')
+            )
+            for form_field_key in requested_registration_fields:
+                validation_decisions[form_field_key] = registration_decisions[form_field_key]
+
         for form_field_key in self.validation_handlers:
             # For every field requiring validation from the client,
             # request a decision for it from the appropriate handler.